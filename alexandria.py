@@ -1,19 +1,27 @@
 import argparse
 import html
+import io
+import json
+import mmap
 import os
-import pickle  # REVIEW move to json?
+import pickle
 import re
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import cached_property
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from functools import lru_cache
+from itertools import islice
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import ParseResult, urlparse
 
 # NOTE TODO this is relative
 ALEXANDRIA_PATH = "alx/"
 DATABASE_PATH = ALEXANDRIA_PATH + "database"
+# databases written before the json format start with a pickle PROTO opcode
+PICKLE_MAGIC = b"\x80"
 DATABASE_README = ALEXANDRIA_PATH + "README.md"
 MIRRORS_PATH = ALEXANDRIA_PATH + "mirrors/"
 DEFAULT_PORT = 8000
@@ -21,39 +29,140 @@ DEBUG = False
 EXIT_SUCCESS = 0
 LINK_MASK = "\u001b]8;;{}\u001b\\{}\u001b]8;;\u001b\\"
 MAX_TRUNC = 45
+MAX_DOWNLOADS = 4
+MAX_LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# %B without the locale lookup, strftime runs in the C locale anyway
+MONTHS = ("January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December")
+SIZE_UNITS = ("KiB", "MiB", "GiB")
+TITLE_TRANS = str.maketrans({"|": "-", "\n": None})
+URL_PREFIX_RE = re.compile(r"^(?:https?://)?(?:www\.)?")
+# already tokenized, only the mirrors path and the domains change per call
+WGET_ARGS = ("--mirror", "-p", "--recursive", "-l", "1", "--page-requisites", "--adjust-extension", "--span-hosts",
+             "-U", "Mozilla", "-E", "-k",
+             "-e", "robots=off", "--random-wait", "--no-cookies",
+             "--convert-links", "--restrict-file-names=windows", "--no-parent")
+TITLE_READ_LIMITS = (64 * 1024, 1024 * 1024)
+try:
+    # possessive quantifiers never backtrack into the tag or the text (python >= 3.11)
+    TITLE_RE = re.compile(rb"<title\b(?:[^>\"']|\"[^\"]*+\"|'[^']*+')*+>([^<]{1,1024}+)</title>",
+                          flags=re.IGNORECASE)
+except re.error:
+    TITLE_RE = re.compile(rb"<title\b(?:[^>\"']|\"[^\"]*\"|'[^']*')*>([^<]{1,1024})</title>", flags=re.IGNORECASE)
 
 
 def from_static(name):
     return f"./static/{name}"
 
 
+@lru_cache(maxsize=1024)
+def parse_url(url):
+    # fast path for the plain http(s)://host/path?query shape, urlparse otherwise;
+    # cached, so the same url string always gives back the same (immutable) result
+    scheme, sep, rest = url.partition("://")
+    if not sep or scheme not in ("http", "https") or not rest.isprintable() or any(c in rest for c in " #;@[\\"):
+        return urlparse(url)
+    netloc, slash, rest = rest.partition("/")
+    if "?" in netloc:
+        # a query right after the host, no path: leave the split to urlparse
+        return urlparse(url)
+    path, _, query = (slash + rest).partition("?")
+    return ParseResult(scheme, netloc, path, "", query, "")
+
+
+def find_title(content, end=None):
+    # plain find sweep, no regex backtracking on the common case;
+    # None for anything it cannot be sure of, TITLE_RE takes those
+    end = len(content) if end is None else end
+    start = content.find(b"<title", 0, end)
+    if start == -1:
+        return None
+    start += len(b"<title")
+    # "<titlebar>" is another tag
+    if content[start:start + 1] not in (b">", b" ", b"\t", b"\n", b"\r", b"\f"):
+        return None
+    close = content.find(b">", start, end)
+    # a quoted attribute may hide a ">"
+    if close == -1 or content.find(b'"', start, close) != -1 or content.find(b"'", start, close) != -1:
+        return None
+    start = close + 1
+    end = content.find(b"</title>", start, end)
+    if end == -1:
+        return None
+    return content[start:end]
+
+
+@lru_cache(maxsize=4096)
+def grep_title(path, mtime_ns, size):
+    # mtime_ns and size are only part of the cache key, a changed file is a miss
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        # scanned in place from the page cache, only the title bytes are copied
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            # <title> lives in <head>: look at a small head first, a bigger one only if needed
+            for limit in TITLE_READ_LIMITS:
+                title = find_title(content, limit)
+                if not title:
+                    # uppercase tags, quoted attributes (maybe with a ">") or a <title...> lookalike first
+                    found = TITLE_RE.search(content, 0, limit)
+                    title = found and found.groups()[0]
+                if title or len(content) <= limit:
+                    break
+    return title and html.unescape(title.decode("utf-8", errors="replace"))
+
+
+@lru_cache(maxsize=1024)
+def directory_size(path, mtime_ns):
+    # mtime_ns is only part of the cache key; pages sharing a domain walk it once.
+    # it only changes with the direct children, so downloads clear the cache
+    total = 0
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.is_file(follow_symlinks=False):
+                    total += e.stat(follow_symlinks=False).st_size
+    return total
+
+
+def scan_dir(path):
+    try:
+        with os.scandir(path) as it:
+            return {e.name: e for e in it}
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+
+
 def sanitize_title(title):
-    return title.replace("|", "-").replace("\n", "")
+    # one pass over the title instead of a replace per character
+    return title.translate(TITLE_TRANS)
 
 
+@lru_cache(maxsize=8192)
 def sanitize_size(num):
     if num == 0:
         return "0 B"
 
-    KiB = 1024
-    units = ("KiB", "MiB", "GiB")
-    for u in units:
-        num /= KiB
-        if abs(num) < KiB:
-            break
-    return f"{num:3.1f} {u}"
+    # every unit is 10 bits, the bit length picks it without a division loop
+    exp = max(1, min(len(SIZE_UNITS), (abs(num).bit_length() - 1) // 10))
+    return f"{num / (1 << 10 * exp):3.1f} {SIZE_UNITS[exp - 1]}"
 
 
 def sanitize_url(url):
-    url = url.removeprefix("https://").removeprefix("http://").removeprefix("www.")
+    url = URL_PREFIX_RE.sub("", url, count=1)
     if len(url) > MAX_TRUNC:
         url = url[:MAX_TRUNC] + "(...)"
     return url
 
 
+@lru_cache(maxsize=8192)
 def sanitize_datetime(dt):
-    datetime_fmt = "%d. %B %Y %I:%M%p"
-    return dt.strftime(datetime_fmt)
+    # same as strftime("%d. %B %Y %I:%M%p"), built in one f-string
+    return (f"{dt.day:02d}. {MONTHS[dt.month - 1]} {dt.year} "
+            f"{dt.hour % 12 or 12:02d}:{dt.minute:02d}{'PM' if dt.hour >= 12 else 'AM'}")
 
 
 def border(msg):
@@ -82,50 +191,84 @@ def title_print(title):
 
 class HTTPServerAlexandria(SimpleHTTPRequestHandler):
     server_version = "HTTPServerAlexandria"
+    # buffered wfile, written chunks are coalesced and flushed per request
+    wbufsize = io.DEFAULT_BUFFER_SIZE
     template_name = from_static("index.html")
     stylesheet = from_static("index.css")
+    # requests run in their own threads, only one of them reloads the shared database
+    database_lock = threading.Lock()
 
-    @cached_property
-    def html_template(self):
-        with open(self.template_name, "r") as f:
-            return f.read()
+    @classmethod
+    @lru_cache(maxsize=None)
+    def html_template(cls):
+        # a handler is created per request, read, split and encode the template once per process
+        with open(cls.template_name, "r") as f:
+            head, _, tail = f.read().partition("{table}")
+        return bytes(head.format(css=cls.stylesheet), "utf-8"), bytes(tail, "utf-8")
 
     def log_message(self, fmt, *args):
         if DEBUG:
             return super().log_message(fmt, *args)
 
-    def response_index(self, status_code, **context):
-        template = self.html_template.format(css=self.stylesheet, **context)
+    def response_index(self, status_code, table):
+        # the encoded table goes between the cached template halves, never joined into one string
+        head, tail = self.html_template()
+        chunks = [head, table, tail]
 
         self.send_response(status_code)
-        self.send_header("Content-type", "text/html")
+        self.send_header("Content-type", "text/html; charset=utf-8")
+        # rows are already encoded, so the length is known before the first write
+        self.send_header("Content-Length", str(sum(map(len, chunks))))
         self.end_headers()
-        self.wfile.write(bytes(template, "utf-8"))
+        self.wfile.writelines(chunks)
+
+    def copyfile(self, source, outputfile):
+        # mirrored files go from the page cache to the socket (os.sendfile), no python read loop
+        if outputfile is not self.wfile:
+            return super().copyfile(source, outputfile)
+        # the headers may still be sitting in the buffered wfile
+        outputfile.flush()
+        self.connection.sendfile(source)
+
+    def database(self):
+        # loaded once per server, read again only when the cli saved new mirrors
+        with self.database_lock:
+            database = getattr(self.server, "database", None)
+            if database is None or database.changed_on_disk():
+                database = self.server.database = Database(DATABASE_PATH)
+            return database
 
     def do_GET(self):
         url = urlparse(self.path)
 
         if url.path == "/":
-            database = Database(DATABASE_PATH)
-            return self.response_index(200, table=database.to_html())
+            return self.response_index(200, self.database().html_bytes())
         return super().do_GET()
 
 
 class Webpage:
-    title_re = re.compile(r"<title.*?>(.+?)</title>", flags=re.IGNORECASE | re.DOTALL)
+    __slots__ = ("url", "base_path", "full_path", "title_key", "title", "size_key", "size", "created_at")
 
-    def __init__(self, url, created_at=None):
+    def __init__(self, url, created_at=None, title=None, title_key=None, size=None, size_key=None):
         self.url = url
         self.base_path, self.full_path = self.index_path(url)
-        self.title = self.grep_title_from_index()
-        self.size = self.calculate_size_disk(self.base_path)
+        self.title_key = self.stat_key(self.full_path)
+        if title is None or title_key != self.title_key:
+            title = self.grep_title_from_index()
+        self.title = title
+        # same key as the directory_size cache, the walk is skipped on reload
+        self.size_key = os.stat(self.base_path).st_mtime_ns
+        if size is None or size_key != self.size_key:
+            size = directory_size(self.base_path, self.size_key)
+        self.size = size
 
         if created_at is None:
-            debug_print(f"[GENERATED] {self!r}")
             self.created_at = datetime.now()
         else:
-            debug_print(f"[RELOADED] {self!r}")
             self.created_at = created_at
+        # runs once per entry on load, skip building the message when it would not be printed
+        if DEBUG:
+            debug_print(f"[{'RELOADED' if created_at else 'GENERATED'}] {self!r}")
 
     def __hash__(self):
         return hash(self.url)
@@ -136,58 +279,84 @@ class Webpage:
     def __repr__(self):
         return f"<Mirror url={self.url}>"
 
+    def __setstate__(self, state):
+        # only legacy pickled databases are ever unpickled, their entries carry a plain __dict__ state
+        for k, v in state.items():
+            if k in self.__slots__:
+                setattr(self, k, v)
+
     def __str__(self):
         return self.url
 
     @classmethod
     def from_webpage(cls, other):
         # Re-crate mirror from other mirror - migrate
-        return cls(other.url, other.created_at)
+        # old entries has no title_key/size_key, title and size are computed again
+        return cls(other.url, other.created_at, other.title, getattr(other, "title_key", None),
+                   other.size, getattr(other, "size_key", None))
+
+    @classmethod
+    def from_json(cls, entry):
+        title_key = entry.get("title_key")
+        return cls(entry["url"], datetime.fromisoformat(entry["created_at"]), entry.get("title"),
+                   title_key and tuple(title_key), entry.get("size"), entry.get("size_key"))
+
+    def to_json(self):
+        return {"url": self.url, "created_at": self.created_at.isoformat(),
+                "title": self.title, "title_key": list(self.title_key),
+                "size": self.size, "size_key": self.size_key}
+
+    @staticmethod
+    def stat_key(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
 
     def index_path(self, url):
-        url = urlparse(url)
-        path = MIRRORS_PATH + url.netloc + url.path
+        return self.resolve_index(MIRRORS_PATH, url)
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def resolve_index(mirrors_path, url):
+        # a found index is kept, mirrors are not moved once downloaded
+        url = parse_url(url)
+        path = mirrors_path + url.netloc + url.path
         if path[-1] == "/":
             path = path[:-1]
 
+        # one scandir per directory instead of a stat per candidate
+        parent, _, name = path.rpartition("/")
+        siblings = scan_dir(parent)
+        is_dir = name in siblings and siblings[name].is_dir()
+        children = scan_dir(path) if is_dir else {}
+
         possibles_files = [
-            Path(path),
-            Path(path + ".html"),
-            Path(path) / "index.html",
-            Path(path) / ("index.html@" + url.query + ".html"),
+            (siblings, parent, name),
+            (siblings, parent, name + ".html"),
+            (children, path, "index.html"),
+            (children, path, "index.html@" + url.query + ".html"),
         ]
-        if (not Path(path).is_dir()):
-            possibles_files += [p for p in Path(path).parent.glob("*.html")
-                                if url.query in str(p)]
-
-        for f in possibles_files:
-            if f.is_file():
-                return (MIRRORS_PATH + url.netloc), str(f)
+        if not is_dir:
+            possibles_files += [(siblings, parent, n) for n in siblings
+                                if n.endswith(".html") and not n.startswith(".")
+                                and url.query in f"{parent}/{n}"]
+
+        for entries, directory, f in possibles_files:
+            if f in entries and entries[f].is_file():
+                return (mirrors_path + url.netloc), str(Path(directory) / f)
         # TODO move to a exception
         assert False, ("unreachable - cound not determinate the html file!\n"
-                       "check there is any option available: \n") + "\n".join(str(p) for p in possibles_files)
+                       "check there is any option available: \n") + "\n".join(
+                           str(Path(directory) / f) for _, directory, f in possibles_files)
 
     def grep_title_from_index(self):
-        file_text = ""
-        with open(self.full_path, "r") as f:
-            for line in f.readlines():
-                file_text += line
-                f = self.title_re.search(file_text)
-                if f:
-                    return html.unescape(f.groups()[0])
+        title = grep_title(self.full_path, *self.title_key)
         # TODO move to a exception
-        assert False, (f"unreachable - do not found <title> in the html\n"
+        assert title, (f"unreachable - do not found <title> in the html\n"
                        f"-> {self.url} NEED be a staticpage!")
+        return title
 
     def calculate_size_disk(self, path):
-        total = 0
-        with os.scandir(path) as f:
-            for e in f:
-                if e.is_dir():
-                    total += self.calculate_size_disk(e.path)
-                if e.is_file():
-                    total += e.stat().st_size
-        return total
+        return directory_size(path, os.stat(path).st_mtime_ns)
 
     def to_html(self):
         title = sanitize_title(self.title)
@@ -214,29 +383,70 @@ class Database():
 
     def __init__(self, path):
         self.path = path
-        self.data = []
-        self.initial_migration_if_need(path)
-
-        with open(path, "rb") as f:
-            db_file = pickle.load(f)
-
-        for entry in db_file:
-            self.add(Webpage.from_webpage(entry))
+        # keyed by url, insertion ordered, so it is both the index and the list
+        self.data = {}
+        self.dirty = False
+        # entries data[:saved] are already on disk
+        self.saved = 0
+        self.html_cache = None
+        self.disk_key = None
+        # a fresh database was just written empty, nothing to read back
+        if not self.initial_migration_if_need(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            self.disk_key = Webpage.stat_key(f.fileno())
+            # parsed straight from the file buffer, the whole file is never held in memory
+            if f.peek(1).startswith(PICKLE_MAGIC):
+                # one-shot migration, the next save rewrites it all as json
+                db_file = self.unpickle_legacy(f)
+            else:
+                # one json entry per line, saves append new lines
+                db_file = [json.loads(line) for line in f if not line.isspace()]
+
+        # rebuilding an entry is mostly stat/read syscalls, overlap them
+        with ThreadPoolExecutor(max_workers=MAX_LOAD_WORKERS) as executor:
+            webpages = list(executor.map(Webpage.from_json, db_file))
+
+        stale = False
+        for entry, webpage in zip(db_file, webpages):
+            stale |= webpage.to_json() != entry
+            self.add(webpage)
+        # refreshed titles/sizes (or a legacy pickle) only reach the disk on a full rewrite
+        self.dirty = stale
+        self.saved = 0 if stale else len(self.data)
         debug_print(f"Database loaded! - total: {len(self.data)}")
 
+    @staticmethod
+    def unpickle_legacy(f):
+        # the old file is a sequence of pickled lists of Webpage, one per save
+        entries = []
+        while f.peek(1):
+            entries += [{"url": e.url, "created_at": e.created_at.isoformat(), "title": e.title, "size": e.size}
+                        for e in pickle.load(f)]
+        return entries
+
     def __iter__(self):
-        return self.data.__iter__()
+        return iter(self.data.values())
+
+    def changed_on_disk(self):
+        try:
+            return Webpage.stat_key(self.path) != self.disk_key
+        except FileNotFoundError:
+            return True
 
     def initial_migration_if_need(self, path):
         file_disk = Path(path)
 
         if not file_disk.exists():
             file_disk.parent.mkdir(exist_ok=True, parents=True)
-            self.save(self.data)
+            self.save()
             debug_print("Initial migration done!")
+            return True
+        return False
 
-    def to_html(self):
-        table = """<table>
+    table_header = """<table>
           <tr>
             <th>Title</th>
             <th>URL</th>
@@ -244,35 +454,70 @@ class Database():
             <th>Created at</th>
           </tr>\n"""
 
-        return table + " ".join(m.to_html() for m in self.data[::-1])
+    def to_html(self):
+        return self.table_header + " ".join([m.to_html() for m in reversed(self.data.values())])
+
+    def html_bytes(self):
+        # rendered once and kept encoded until the next add()
+        if self.html_cache is None:
+            self.html_cache = bytes(self.to_html(), "utf-8")
+        return self.html_cache
 
-    def to_md(self):
+    def md_lines(self):
         today = sanitize_datetime(datetime.now())
-        md_body = "\n".join(site.to_md_line() for site in self.data[::-1])
-        return (f"# Alexandria - generated at {today}\n"
-                f"| Site | Created at |\n"
-                f"| ---- | ---------- |\n"
-                f"{md_body}\n")
+        yield (f"# Alexandria - generated at {today}\n"
+               f"| Site | Created at |\n"
+               f"| ---- | ---------- |\n")
+        for site in reversed(self.data.values()):
+            yield site.to_md_line() + "\n"
 
     def add(self, mr):
-        if mr not in self.data:
-            self.data.append(mr)
+        if mr.url not in self.data:
+            self.data[mr.url] = mr
+            self.dirty = True
+            self.html_cache = None
         else:
             title_print(f"Skip add {mr.url}, already in")
 
-    def save(self, data=None):
-        if data is None:
-            data = self.data
-
+    def needs_save(self):
+        # a pending full rewrite (saved reset to 0) is unsaved data too, even with nothing added
+        return self.dirty or self.saved < len(self.data)
+
+    def refresh_sizes(self, urls):
+        # the stored size_key is the domain directory mtime, which a download into an
+        # existing subdirectory does not change: walk every entry of those domains again.
+        # runs after process_downloads, which already dropped the directory_size cache
+        domains = {parse_url(url).netloc for url in urls}
+        changed = False
+        for webpage in self:
+            if parse_url(webpage.url).netloc in domains:
+                size = webpage.calculate_size_disk(webpage.base_path)
+                changed |= size != webpage.size
+                webpage.size_key = os.stat(webpage.base_path).st_mtime_ns
+                webpage.size = size
+        if changed:
+            # records already on disk carry the old size, rewrite them all
+            self.saved = 0
+            self.dirty = True
+            self.html_cache = None
+
+    def save(self):
         debug_print("Saving mirrors-list on disk...")
-        with open(self.path, "wb") as f:
-            # keeps its overwriting, redo keeping writing and append if it get wrost
-            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        # append only the new entries, rewrite everything when nothing on disk is reusable
+        with open(self.path, "a" if self.saved else "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(w.to_json()) + "\n" for w in islice(self, self.saved, None))
+        self.disk_key = Webpage.stat_key(self.path)
+        self.saved = len(self.data)
+        self.dirty = False
         debug_print("Saved.")
 
-        with open(self.export_file, "wb") as f_export:
-            f_export.write(bytes(self.to_md(), "utf-8"))
-        debug_print(f"Database {DATABASE_README} generated.")
+        self.export()
+
+    def export(self):
+        # rows go straight to a large write buffer, the whole md is never built
+        with open(self.export_file, "w", encoding="utf-8", newline="\n", buffering=1 << 20) as f_export:
+            f_export.writelines(self.md_lines())
+        debug_print(f"Database {self.export_file} generated.")
 
 
 # NOTE Compatibility mode - will drop soon
@@ -282,12 +527,13 @@ class WebPage(Webpage):
     pass
 
 
-def serve(port):
+def serve(port, database=None):
     server = HTTPServerAlexandria
     title_print(f"Start server at {port}")
     title_print(LINK_MASK.format(f"http://localhost:{port}", f"http://localhost:{port}"))
 
-    with HTTPServer(("", port), server) as httpd:
+    with ThreadingHTTPServer(("", port), server) as httpd:
+        httpd.database = database
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
@@ -296,32 +542,36 @@ def serve(port):
             sys.exit(EXIT_SUCCESS)
 
 
-def process_download(url):
-    urlp = urlparse(url)
-    if not bool(urlp.scheme):
-        title_print(f"Not valid url - {url}")
-        sys.exit(EXIT_SUCCESS)
-
-    domain = urlp.hostname
-    title_print(f"Making a mirror of: {url} at {domain}")
+def process_download(urls):
+    # one wget for all the urls of a host, it reads them from stdin
+    host = parse_url(urls[0]).hostname
+    for url in urls:
+        title_print(f"Making a mirror of: {url} at {host}")
 
-    wget_process = (f"wget"
-                    f" -P {MIRRORS_PATH}"
-                    f" --mirror -p --recursive -l 1 --page-requisites --adjust-extension --span-hosts"
-                    f" -U 'Mozilla' -E -k"
-                    f" -e robots=off --random-wait --no-cookies"
-                    f" --convert-links --restrict-file-names=windows --domains {domain}"
-                    f" --no-parent {url}".split(" "))
+    wget_process = ["wget", "-P", MIRRORS_PATH, *WGET_ARGS, "--domains", host, "--input-file=-"]
 
     debug_print("command: {}".format(" ".join(wget_process)))
-    subprocess.run(wget_process, check=False)
-    title_print(f"Finished {url}!!!")
+    # wget is chatty, its output is only worth a terminal when debugging
+    output = None if DEBUG else subprocess.DEVNULL
+    subprocess.run(wget_process, input=bytes("\n".join(urls), "utf-8"), stdout=output, stderr=output, check=False)
+    title_print(f"Finished {', '.join(urls)}!!!")
+
 
+def process_downloads(urls):
+    for url in urls:
+        if not bool(parse_url(url).scheme):
+            title_print(f"Not valid url - {url}")
+            sys.exit(EXIT_SUCCESS)
 
-def generate_md_database(content):
-    with open(DATABASE_README, "wb") as f:
-        f.write(bytes(content, "utf-8"))
-    debug_print(f"Database {DATABASE_README} generated...")
+    # a host is mirrored into one directory, so its urls share a single wget;
+    # up to MAX_DOWNLOADS different hosts are downloaded side by side
+    batches = {}
+    for url in urls:
+        batches.setdefault(parse_url(url).hostname, []).append(url)
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOADS) as executor:
+        list(executor.map(process_download, batches.values()))
+    # wget may have written into existing subdirectories, cached totals are stale
+    directory_size.cache_clear()
 
 
 if __name__ == "__main__":
@@ -343,21 +593,31 @@ if __name__ == "__main__":
 
     database = Database(DATABASE_PATH)
     if DEBUG and generate_readme:
-        generate_md_database(database.to_md())
+        database.export()
         sys.exit(EXIT_SUCCESS)
 
     # server it - bye!
     if not websites:
-        serve(port)
+        serve(port, database)
         sys.exit(EXIT_SUCCESS)
 
     if skip and DEBUG:
         debug_print("BYPASSING THE PROCESS OF DOWNLOAD - you are on your own", border=True)
     else:
-        for website in websites:
-            process_download(website)
+        # urls already in the database are skipped before paying for a download
+        new_websites = []
+        for website in dict.fromkeys(websites):
+            if website in database.data:
+                title_print(f"Skip add {website}, already in")
+            else:
+                new_websites.append(website)
+
+        process_downloads(new_websites)
+        database.refresh_sizes(new_websites)
+        for website in new_websites:
             webpage = WebPage(website)
             database.add(webpage)
 
-    database.save()
-    generate_md_database(database.to_md())
+    # save already exports the README
+    if database.needs_save():
+        database.save()
@@ -1,32 +1,57 @@
+import copyreg
+import json
 import os
+import pickle
 import tempfile
+import threading
 from datetime import datetime
+from functools import partial
+from http.server import ThreadingHTTPServer
+from pathlib import Path
 from unittest import TestCase
 from unittest.mock import patch
+from urllib.parse import urlparse
+from urllib.request import urlopen
 
 import alexandria as alx
-from alexandria import (Database, Webpage, border, debug_print, sanitize_datetime,
-                        sanitize_size, sanitize_title, sanitize_url, title_print)
+from alexandria import (Database, HTTPServerAlexandria, Webpage, border, debug_print, find_title, grep_title, parse_url,
+                        process_downloads, sanitize_datetime, sanitize_size, sanitize_title, sanitize_url, title_print)
 
 ENCODE = "utf-8"
 HTML_CONTENT = "<html><head><title>Wikipedia - Python</title></head>\n"
+HTML_CONTENT_BYTES = bytes(HTML_CONTENT, ENCODE)
+HTML_CONTENT_SIZE = len(HTML_CONTENT_BYTES)
 DATABASE_DEFAULT = b"\x80\x05\x5D\x94."
 
 
+class LegacyWebPage:
+    # what the pre-json code pickled: a plain __dict__, no title_key/size_key
+    def __init__(self, url, created_at):
+        self.url = url
+        self.base_path = "alx/mirrors/old"
+        self.full_path = "alx/mirrors/old/index.html"
+        self.title = "Old title"
+        self.size = 1
+        self.created_at = created_at
+
+    def __reduce__(self):
+        # pickled under the class name alexandria.WebPage, like the old saves
+        return copyreg._reconstructor, (alx.WebPage, object, None), self.__dict__
+
+
 class AlexandriaTestCase:
     def setup_db(self):
         db_path = self.path.name + "/database"
-        with open(db_path, "wb") as f:
-            f.write(DATABASE_DEFAULT)
+        Path(db_path).write_bytes(DATABASE_DEFAULT)
         return db_path
 
     def setup_tmp_path(self):
         return tempfile.TemporaryDirectory("alexandria")
 
     def setup_html(self, path):
-        tmp_html = tempfile.NamedTemporaryFile("w+b", dir=path, suffix=".html", delete=False)
-        tmp_html.write(bytes(HTML_CONTENT, ENCODE))
-        html = tmp_html.name.split("/")[-1]
+        with tempfile.NamedTemporaryFile("wb", dir=path, suffix=".html", delete=False) as tmp_html:
+            tmp_html.write(HTML_CONTENT_BYTES)
+        html = os.path.basename(tmp_html.name)
         return html
 
     @classmethod
@@ -34,8 +59,9 @@ class AlexandriaTestCase:
         cls.path = cls.setup_tmp_path(cls)
         cls.html = cls.setup_html(cls, cls.path.name)
 
-        path = cls.path.name.split("/")[-1]
+        path = os.path.basename(cls.path.name)
         cls.url = f"http://{path}/{cls.html}"
+        cls.full_path = f"{cls.path.name}/{cls.html}"
 
         alx.ALEXANDRIA_PATH = cls.path.name
         alx.MIRRORS_PATH = "/tmp/"
@@ -55,21 +81,47 @@ class TestSanitizers(TestCase):
         url = r"https://test-how-to-do-long-urls.com/whoistoolongurltoshoweverthingint\heview.html"
         self.assertEqual(sanitize_url(url), "test-how-to-do-long-urls.com/whoistoolongurlt(...)")
 
+    def test_sanitize_url_prefix(self):
+        self.assertEqual(sanitize_url("http://www.bin.com/"), "bin.com/")
+        self.assertEqual(sanitize_url("https://bin.com/www.html"), "bin.com/www.html")
+
     def test_sanitize_datetime(self):
         today = datetime(1997, 1, 1)
         self.assertEqual(sanitize_datetime(today), "01. January 1997 12:00AM")
+        self.assertEqual(sanitize_datetime(datetime(2023, 12, 31, 12, 5)), "31. December 2023 12:05PM")
+        self.assertEqual(sanitize_datetime(datetime(2023, 7, 4, 21, 30)), "04. July 2023 09:30PM")
 
     def test_size(self):
         sizes = (0,
                  1024,
                  1024*1024,
                  1024*1024*1024,
-                 1024*1024*8)
-        sizes_expected = ("0 B", "1.0 KiB", "1.0 MiB", "1.0 GiB", "8.0 MiB")
+                 1024*1024*8,
+                 512,
+                 1024*1024 - 1,
+                 1024*1024*1024*2048)
+        sizes_expected = ("0 B", "1.0 KiB", "1.0 MiB", "1.0 GiB", "8.0 MiB",
+                          "0.5 KiB", "1024.0 KiB", "2048.0 GiB")
         for size, expected in zip(sizes, sizes_expected):
             self.assertEqual(sanitize_size(size), expected)
 
 
+class TestParseUrl(TestCase):
+    def test_parse_url(self):
+        urls = ("https://en.wikipedia.org/wiki/Python",
+                "http://bin.com/index.html?page=2",
+                "https://bin.com",
+                "https://example.com?page=2",
+                "https://user@bin.com/path#top",
+                "ftp://bin.com/file")
+        for url in urls:
+            self.assertEqual(parse_url(url), urlparse(url))
+
+    def test_parse_url_interned(self):
+        url = "https://en.wikipedia.org/wiki/Python"
+        self.assertIs(parse_url(url), parse_url("".join(url)))
+
+
 class TestLog(AlexandriaTestCase, TestCase):
     def test_border(self):
         msg = border("Test msg")
@@ -136,11 +188,139 @@ class TestDatabase(AlexandriaTestCase, TestCase):
         database.add(webpage)
         database.save()
 
-        self.assertEqual(database.data, [webpage])
+        self.assertEqual(list(database), [webpage])
         with open(db_path, "rb") as f:
             db = f.read()
         self.assertNotEqual(db, DATABASE_DEFAULT)
 
+    @patch("builtins.print")
+    def test_add_duplicate(self, mock_print):
+        database = Database(self.setup_db())
+        database.add(Webpage(self.url))
+        database.add(Webpage(self.url))
+
+        self.assertEqual(len(database.data), 1)
+        self.assertEqual(list(database.data), [self.url])
+
+    def test_reload(self):
+        db_path = self.setup_db()
+        database = Database(db_path)
+        webpage = Webpage(self.url, datetime(1972, 12, 17))
+        database.add(webpage)
+        database.save()
+
+        reloaded = Database(db_path)
+        self.assertEqual(list(reloaded), [webpage])
+        self.assertEqual(reloaded.data[self.url].created_at, webpage.created_at)
+        self.assertEqual(reloaded.data[self.url].title, webpage.title)
+
+    def test_save_appends(self):
+        db_path = self.setup_db()
+        database = Database(db_path)
+        database.add(Webpage(self.url))
+        database.save()
+        saved_size = os.path.getsize(db_path)
+
+        html = self.setup_html(self.path.name)
+        self.addCleanup(os.remove, f"{self.path.name}/{html}")
+        database.add(Webpage(self.url.replace(self.html, html)))
+        database.save()
+
+        self.assertGreater(os.path.getsize(db_path), saved_size)
+        self.assertEqual(Database(db_path).data, database.data)
+
+    def test_html_bytes_cache(self):
+        database = Database(self.setup_db())
+        empty_table = database.html_bytes()
+        self.assertIs(database.html_bytes(), empty_table)
+
+        webpage = Webpage(self.url)
+        database.add(webpage)
+        self.assertIn(bytes(webpage.title, ENCODE), database.html_bytes())
+
+    def test_migrate_pickle(self):
+        db_path = self.setup_db()
+        legacy = LegacyWebPage(self.url, datetime(1972, 12, 17))
+        with open(db_path, "wb") as f:
+            # the old save appended one pickled list per run
+            f.write(pickle.dumps([], pickle.HIGHEST_PROTOCOL))
+            f.write(pickle.dumps([legacy], pickle.HIGHEST_PROTOCOL))
+
+        database = Database(db_path)
+        self.assertEqual(list(database.data), [self.url])
+        self.assertEqual(database.data[self.url].title, "Wikipedia - Python")
+        self.assertEqual(database.saved, 0)
+        # nothing was added, the migration alone has to be written
+        self.assertTrue(database.dirty)
+
+        database.save()
+        with open(db_path, "rb") as f:
+            self.assertFalse(f.peek(1).startswith(alx.PICKLE_MAGIC))
+            entry = json.loads(f.readline())
+        self.assertEqual(entry["url"], self.url)
+        self.assertEqual(entry["created_at"], "1972-12-17T00:00:00")
+
+    def test_reload_not_stale(self):
+        db_path = self.setup_db()
+        database = Database(db_path)
+        database.add(Webpage(self.url))
+        database.save()
+
+        reloaded = Database(db_path)
+        self.assertEqual(reloaded.saved, 1)
+        self.assertFalse(reloaded.dirty)
+
+    def test_refresh_sizes(self):
+        nested = f"{self.path.name}/nested"
+        os.mkdir(nested)
+        self.addCleanup(os.rmdir, nested)
+        db_path = self.setup_db()
+        database = Database(db_path)
+        database.add(Webpage(self.url))
+        database.save()
+        size = database.data[self.url].size
+
+        # a new file in a subdirectory leaves the domain directory mtime untouched
+        Path(f"{nested}/page.html").write_bytes(b"a" * 500)
+        self.addCleanup(os.remove, f"{nested}/page.html")
+        # as process_downloads does once wget is done
+        alx.directory_size.cache_clear()
+        database.refresh_sizes([self.url])
+        self.assertTrue(database.dirty)
+        self.assertEqual(database.saved, 0)
+        database.save()
+
+        # the fixture database lives in the mirror directory too, so only a lower bound
+        refreshed = database.data[self.url].size
+        self.assertGreaterEqual(refreshed, size + 500)
+        self.assertEqual(Database(db_path).data[self.url].size, refreshed)
+
+    def test_changed_on_disk(self):
+        db_path = self.setup_db()
+        database = Database(db_path)
+        self.assertFalse(database.changed_on_disk())
+
+        other = Database(db_path)
+        other.add(Webpage(self.url))
+        other.save()
+        self.assertTrue(database.changed_on_disk())
+        self.assertFalse(other.changed_on_disk())
+
+    def test_dirty(self):
+        database = Database(self.setup_db())
+        self.assertFalse(database.dirty)
+
+        database.add(Webpage(self.url))
+        self.assertTrue(database.dirty)
+
+        database.save()
+        self.assertFalse(database.dirty)
+        self.assertFalse(database.needs_save())
+
+        # records on disk are outdated, a full rewrite is pending
+        database.saved = 0
+        self.assertTrue(database.needs_save())
+
     def test_export(self):
         database = Database(self.setup_db())
         webpage = Webpage(self.url)
@@ -148,7 +328,7 @@ class TestDatabase(AlexandriaTestCase, TestCase):
         database.add(webpage)
         database.save()
 
-        self.assertEqual(database.data, [webpage])
+        self.assertEqual(list(database), [webpage])
         with open(database.export_file, "rb") as f:
             md_file = f.read()
         self.assertIn(bytes("Alexandria - generated at", ENCODE), md_file)
@@ -164,7 +344,7 @@ class TestWebpage(AlexandriaTestCase, TestCase):
         self.assertEqual(webpage.title, "Wikipedia - Python")
         self.assertEqual(webpage.url, self.url)
         self.assertEqual(webpage.base_path, self.path.name)
-        self.assertEqual(webpage.full_path, (self.path.name + "/" + self.html))
+        self.assertEqual(webpage.full_path, self.full_path)
 
     @patch('builtins.print')
     def test_was_loaded_from_webpate(self, mock_stdout):
@@ -178,6 +358,10 @@ class TestWebpage(AlexandriaTestCase, TestCase):
         self.assertEqual(webpage, webpage_base)
         self.assertNotEqual(id(webpage), id(webpage_base))
 
+    def test_slots(self):
+        webpage = Webpage(self.url)
+        self.assertFalse(hasattr(webpage, "__dict__"))
+
     def test_eq(self):
         webpage = Webpage(self.url)
         webpage_two = Webpage(self.url)
@@ -193,12 +377,139 @@ class TestWebpage(AlexandriaTestCase, TestCase):
 
     def test_to_html(self):
         webpage = Webpage(self.url)
+        html = webpage.to_html()
 
-        self.assertIn("<tr>", webpage.to_html())
-        self.assertIn(self.html, webpage.to_html())
-        self.assertIn(webpage.title, webpage.to_html())
-        self.assertIn("</tr>", webpage.to_html())
+        self.assertIn("<tr>", html)
+        self.assertIn(self.html, html)
+        self.assertIn(webpage.title, html)
+        self.assertIn("</tr>", html)
 
     def test_calculate_size_disk(self):
         webpage = Webpage(self.url)
-        self.assertEqual(webpage.calculate_size_disk(self.path.name), len(bytes(HTML_CONTENT, ENCODE)))
+        self.assertEqual(webpage.calculate_size_disk(self.path.name), HTML_CONTENT_SIZE)
+
+    def test_find_title(self):
+        self.assertEqual(find_title(b"<html><title>Python</title>"), b"Python")
+        self.assertEqual(find_title(b"<title lang=en>Python</title>"), b"Python")
+        self.assertIsNone(find_title(b'<title lang="en">Python</title>'))
+        self.assertIsNone(find_title(b'<title data-x="a>b">Real</title>'))
+        self.assertIsNone(find_title(b"<titlebar>x</titlebar><title>T</title>"))
+        self.assertIsNone(find_title(b"<TITLE>Python</TITLE>"))
+        self.assertIsNone(find_title(b"<title>Python"))
+
+    def test_title_re(self):
+        contents = (b"<TITLE>Python</TITLE>",
+                    b'<title data-x="a>b">Real</title>',
+                    b"<title data-x='a>b'>Real</title>",
+                    b"<titlebar>x</titlebar><title>T</title>")
+        for content, expected in zip(contents, (b"Python", b"Real", b"Real", b"T")):
+            self.assertEqual(alx.TITLE_RE.search(content).group(1), expected)
+
+    def test_grep_title_past_head(self):
+        head = alx.TITLE_READ_LIMITS[0]
+        html_path = self.path.name + "/long_head.html"
+        with open(html_path, "wb") as f:
+            f.write(b"<html><head>" + b" " * head + b"<TITLE>Python</TITLE>")
+        self.addCleanup(os.remove, html_path)
+
+        self.assertEqual(grep_title(html_path, 0, 0), "Python")
+
+    @patch("alexandria.directory_size")
+    def test_size_cached_on_reload(self, size_mock):
+        size_mock.return_value = HTML_CONTENT_SIZE
+        webpage_base = Webpage(self.url)
+        size_mock.reset_mock()
+        webpage = Webpage.from_webpage(webpage_base)
+
+        size_mock.assert_not_called()
+        self.assertEqual(webpage.size, webpage_base.size)
+
+    @patch("alexandria.Webpage.grep_title_from_index")
+    def test_title_cached_on_reload(self, grep_mock):
+        webpage_base = Webpage(self.url)
+        grep_mock.reset_mock()
+        webpage = Webpage.from_webpage(webpage_base)
+
+        grep_mock.assert_not_called()
+        self.assertEqual(webpage.title, webpage_base.title)
+        self.assertEqual(webpage.title_key, webpage_base.title_key)
+
+
+class TestServer(AlexandriaTestCase, TestCase):
+    def setup_server(self, database):
+        handler = partial(HTTPServerAlexandria, directory=self.path.name)
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        httpd.database = database
+        # short poll, shutdown() waits for it
+        thread = threading.Thread(target=httpd.serve_forever, args=(0.01,))
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(httpd.shutdown)
+        return f"http://127.0.0.1:{httpd.server_port}"
+
+    def test_serve(self):
+        database = Database(self.setup_db())
+        database.add(Webpage(self.url))
+        database.save()
+        base_url = self.setup_server(database)
+
+        with urlopen(f"{base_url}/") as response:
+            body = response.read()
+            self.assertEqual(int(response.headers["Content-Length"]), len(body))
+        self.assertIn(b"Wikipedia - Python", body)
+        self.assertTrue(body.rstrip().endswith(b"</html>"))
+
+        # mirrored files go through copyfile/sendfile
+        with urlopen(f"{base_url}/{self.html}") as response:
+            body = response.read()
+            self.assertEqual(int(response.headers["Content-Length"]), len(body))
+        self.assertEqual(body, HTML_CONTENT_BYTES)
+
+
+class TestDownload(TestCase):
+    @patch("builtins.print")
+    @patch("subprocess.run")
+    def test_process_downloads(self, run_mock, mock_print):
+        urls = [f"https://bin{i}.com/" for i in range(alx.MAX_DOWNLOADS * 2)]
+        process_downloads(urls)
+
+        self.assertEqual(run_mock.call_count, len(urls))
+        called_urls = []
+        for call in run_mock.call_args_list:
+            argv = call.args[0]
+            self.assertIn("--input-file=-", argv)
+            self.assertEqual(argv[argv.index("-U") + 1], "Mozilla")
+            called_urls += call.kwargs["input"].decode(ENCODE).split("\n")
+        self.assertEqual(sorted(called_urls), sorted(urls))
+        self.assertIs(run_mock.call_args.kwargs["stdout"], alx.subprocess.DEVNULL)
+
+    @patch("builtins.print")
+    @patch("subprocess.run")
+    def test_process_downloads_clear_size_cache(self, run_mock, mock_print):
+        with tempfile.TemporaryDirectory() as path:
+            alx.directory_size(path, 0)
+            process_downloads(["https://bin.com/"])
+        self.assertEqual(alx.directory_size.cache_info().currsize, 0)
+
+    @patch("builtins.print")
+    @patch("subprocess.run")
+    def test_process_downloads_same_host(self, run_mock, mock_print):
+        urls = ["https://a.com/1", "https://b.com/", "https://a.com/2"]
+        process_downloads(urls)
+
+        self.assertEqual(run_mock.call_count, 2)
+        for call in run_mock.call_args_list:
+            argv = call.args[0]
+            host = argv[argv.index("--domains") + 1]
+            called_urls = call.kwargs["input"].decode(ENCODE).split("\n")
+            self.assertEqual({parse_url(url).hostname for url in called_urls}, {host})
+            if host == "a.com":
+                self.assertEqual(called_urls, ["https://a.com/1", "https://a.com/2"])
+
+    @patch("builtins.print")
+    @patch("subprocess.run")
+    def test_process_downloads_invalid_url(self, run_mock, mock_print):
+        with self.assertRaises(SystemExit):
+            process_downloads(["https://bin.com/", "bin.com"])
+        run_mock.assert_not_called()